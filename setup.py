@@ -16,6 +16,18 @@ def read_requirements():
     with open("requirements.txt", "r", encoding="utf-8") as fh:
         return [line.strip() for line in fh if line.strip() and not line.startswith("#")]
 
+# Optionally compile the hot pure-Python helpers to a C extension with mypyc.
+# Set DETECTION_AI_MYPYC=1 (with mypyc installed) to build it; the .py module
+# is still shipped and used whenever the extension is not available.
+def compiled_modules():
+    if os.environ.get("DETECTION_AI_MYPYC") != "1":
+        return []
+    from mypyc.build import mypycify
+    # src/ is installed as top-level modules, so compile it as "detection_core"
+    # rather than "src.detection_core"
+    os.environ.setdefault("MYPYPATH", "src")
+    return mypycify(["--explicit-package-bases", "src/detection_core.py"])
+
 setup(
     name="detection-ai-check-script",
     version="1.0.0",
@@ -46,6 +58,8 @@ setup(
     ],
     packages=find_packages(where="src"),
     package_dir={"": "src"},
+    py_modules=["detection_test_script", "detection_core", "ui"],
+    ext_modules=compiled_modules(),
     python_requires=">=3.8",
     install_requires=read_requirements(),
     extras_require={
@@ -53,6 +67,7 @@ setup(
             "pytest>=7.4.0",
             "pytest-cov>=4.1.0",
             "pytest-mock>=3.11.0",
+            "pytest-xdist>=3.3.0",
             "black>=23.7.0",
             "flake8>=6.0.0",
             "isort>=5.12.0",
@@ -61,6 +76,12 @@ setup(
             "safety>=2.3.0",
             "pre-commit>=3.3.0",
         ],
+        "semantic": [
+            "numpy>=1.24.0",
+        ],
+        "json": [
+            "orjson>=3.9.0",
+        ],
     },
     entry_points={
         "console_scripts": [
@@ -0,0 +1,105 @@
+# =============================================================================
+# AI Detection Validator - Detection validation and prompt generation
+#
+# Pure functions with no I/O, used by detection_test_script on every run.
+# They are fully annotated so the module can be compiled with mypyc; see
+# setup.py. The pure-Python source remains the fallback.
+# =============================================================================
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Gemini API keys don't have a standard prefix, so the format rule is a minimum length
+_API_KEY_MIN_LENGTH = 20
+
+def validate_api_key(api_key: Optional[str]) -> Tuple[bool, str]:
+    """
+    Validate the API key format and length.
+    """
+    length = len(api_key) if api_key else 0
+    if length == 0:
+        return False, "API key is required"
+    if length < _API_KEY_MIN_LENGTH:
+        return False, "API key appears to be too short"
+    return True, "API key format is valid"
+
+# Detection config fields that must be present and non-empty
+_REQUIRED_FIELDS = frozenset({'title', 'description', 'sql_search', 'source_table'})
+
+def validate_detection_config(config: object) -> Tuple[bool, str]:
+    """
+    Validate that all required detection parameters are present.
+    Anything other than a mapping (an empty file, a list) is missing every field.
+    """
+    if not isinstance(config, dict):
+        missing_fields = _REQUIRED_FIELDS
+    else:
+        missing_fields = _REQUIRED_FIELDS - {key for key, value in config.items() if value}
+    
+    if missing_fields:
+        return False, f"Missing required fields: {', '.join(sorted(missing_fields))}"
+    
+    return True, "All required fields present"
+
+# Detection improvement prompt: a shared preamble followed by the per-detection
+# request, filled from the detection config fields
+_PROMPT_PREAMBLE = (
+    "I am a cyber security detection engineer developing a new detection using spark SQL for databricks "
+    "to search across a cyber datalake. I am looking for you to provide the top three most insightful "
+    "feedbacks you can to improve my detections coverage and quality to maximize True positive outcomes. "
+)
+_DETECTION_TEMPLATE = (
+    "Based on the description '{description}' and considering the source log table '{source_table}', "
+    "please help me improve my title from '{title}' and SQL search '{sql_search}' with your top three feedback tips. "
+    "Please keep them under two sentences long."
+)
+_PROMPT_TEMPLATE = _PROMPT_PREAMBLE + _DETECTION_TEMPLATE
+
+# Several detections reviewed in one request share the preamble once
+_BATCH_INSTRUCTIONS = (
+    "I will give you several detections. Answer each one separately under a heading "
+    "that repeats its number exactly, for example '### Detection 1'.\n\n"
+)
+# Models don't always follow the requested heading style, so also accept bold
+# ('**Detection 1**') and plain ('Detection 1:') headings at the start of a line
+_BATCH_HEADING_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"#+[ \t]*(?:\*\*|__)?[ \t]*Detection[ \t]+(\d+)\b.*"
+    r"|(?:\*\*|__)[ \t]*Detection[ \t]+(\d+)\b.*?(?:\*\*|__)[ \t]*:?"
+    r"|Detection[ \t]+(\d+)[ \t]*(?:[:.)-]|$)"
+    r")",
+    re.MULTILINE,
+)
+
+def generate_detection_prompt(config: Dict[str, Any]) -> str:
+    """
+    Generate the cybersecurity detection improvement prompt.
+    """
+    return _PROMPT_TEMPLATE.format_map(config)
+
+def generate_batch_prompt(configs: List[Dict[str, Any]]) -> str:
+    """
+    Generate one prompt that asks for numbered feedback on several detections.
+    """
+    sections = "\n\n".join(
+        f"### Detection {number}\n{_DETECTION_TEMPLATE.format_map(config)}"
+        for number, config in enumerate(configs, 1)
+    )
+    return _PROMPT_PREAMBLE + _BATCH_INSTRUCTIONS + sections
+
+def split_batch_feedback(feedback: str, count: int) -> Optional[List[str]]:
+    """
+    Split a combined response into per-detection feedback, in detection order.
+    Returns None if no detection heading was recognised, so the caller can show
+    the response as a whole instead of dropping it.
+    """
+    sections: Dict[int, str] = {}
+    headings = list(_BATCH_HEADING_RE.finditer(feedback))
+    if not headings:
+        return None
+    for index, heading in enumerate(headings):
+        number = int(next(group for group in heading.groups() if group))
+        end = headings[index + 1].start() if index + 1 < len(headings) else len(feedback)
+        sections.setdefault(number, feedback[heading.end():end].strip())
+    return [sections.get(number, "No feedback was returned for this detection.")
+            for number in range(1, count + 1)]
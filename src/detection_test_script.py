@@ -1,13 +1,91 @@
 import sys
 import argparse
+import asyncio
+import functools
+import hashlib
+import importlib.util
 import os
-import google.generativeai as genai
+import tempfile
 import yaml
-from dotenv import load_dotenv
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List, Optional
+
+# Prefer the libyaml-backed loader; fall back to the pure-Python one
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# JSON detection configs skip the YAML grammar entirely; orjson is optional
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json  # type: ignore[no-redef]
+
+def _lazy_import(name: str):
+    """
+    Return a module that is only executed on first attribute access.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# The Gemini SDK pulls in gRPC and protobuf, so defer loading it until a
+# request is actually made; --help and config errors return immediately.
+genai = _lazy_import("google.generativeai")
+
+def _parse_env_value(value: str) -> str:
+    """
+    Return a .env value without surrounding quotes or a trailing ' # comment'.
+    A quoted value ends at its closing quote, so '#' inside it is kept; values
+    with mismatched or stray quotes are left as written.
+    """
+    value = value.strip()
+    if value[:1] in ('"', "'"):
+        end = value.find(value[0], 1)
+        if end != -1:
+            rest = value[end + 1:].strip()
+            if not rest or rest.startswith('#'):
+                return value[1:end]
+        return value
+
+    # An unquoted value ends at the first '#' that follows whitespace
+    for index in range(1, len(value)):
+        if value[index] == '#' and value[index - 1] in ' \t':
+            return value[:index].rstrip()
+    return value
+
+def _load_env(path: str = ".env") -> None:
+    """
+    Load KEY=VALUE pairs from a .env file into the environment. Variables that
+    are already set take precedence, and a missing file is ignored. This runs
+    at import, so lines that aren't valid UTF-8 are skipped rather than raised.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return
+
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line or '\ufffd' in line:
+            continue
+        key, _, value = line.partition('=')
+        key = key.strip()
+        if key.startswith('export '):
+            key = key[len('export '):].strip()
+        os.environ.setdefault(key, _parse_env_value(value))
 
 # Load environment variables from .env file
-load_dotenv()
+_load_env()
 
 # =============================================================================
 # AI Detection Validator v1.0
@@ -22,7 +100,7 @@ load_dotenv()
 # =============================================================================
 #
 # To install the required libraries, run:
-# pip install google-generativeai pyyaml python-dotenv
+# pip install google-generativeai pyyaml
 #
 # To use this script, create a YAML file like this (e.g., detection_config.yml):
 # title: "Suspicious PowerShell Execution with Encoded Commands"
@@ -30,6 +108,9 @@ load_dotenv()
 # sql_search: "SELECT * FROM security_logs WHERE process_name = 'powershell.exe'"
 # source_table: "security_logs"
 #
+# The same fields can also be supplied as a JSON object in a .json file, which
+# is faster to parse for large, machine-generated rule sets.
+#
 # Then run the script from your terminal like this:
 # python3 detection_test_script.py --yaml-file detection_config.yml
 #
@@ -38,289 +119,529 @@ load_dotenv()
 # 2. Set it as an environment variable: export GEMINI_API_KEY="your-api-key-here"
 # 3. Or create a .env file with: GEMINI_API_KEY=your-api-key-here
 
-def create_border(text: str, char: str = "═", width: int = 80) -> str:
-    """Create a bordered text block."""
-    border = char * width
-    return f"{border}\n{text}\n{border}"
-
-def create_section_header(title: str, char: str = "━", width: int = 80) -> str:
-    """Create a section header with decorative elements."""
-    padding = (width - len(title) - 4) // 2
-    left_pad = char * padding
-    right_pad = char * (width - len(title) - 4 - padding)
-    return f"{left_pad} {title} {right_pad}"
-
-def create_info_box(title: str, content: str, width: int = 80) -> str:
-    """Create a formatted information box."""
-    box_top = "┌" + "─" * (width - 2) + "┐"
-    box_bottom = "└" + "─" * (width - 2) + "┘"
-    
-    # Format the title
-    title_line = f"│ {title:<{width-4}} │"
-    
-    # Format the content with word wrapping
-    content_lines = []
-    words = content.split()
-    current_line = ""
-    
-    for word in words:
-        if len(current_line + " " + word) <= width - 6:
-            current_line += (" " + word) if current_line else word
-        else:
-            if current_line:
-                content_lines.append(f"│ {current_line:<{width-4}} │")
-            current_line = word
-    
-    if current_line:
-        content_lines.append(f"│ {current_line:<{width-4}} │")
-    
-    return "\n".join([box_top, title_line, "├" + "─" * (width - 2) + "┤"] + content_lines + [box_bottom])
+if __package__:
+    from .detection_core import (generate_batch_prompt, generate_detection_prompt,
+                                 split_batch_feedback, validate_api_key,
+                                 validate_detection_config)
+    from .ui import (emit, format_detection_info, format_feedback_section, format_footer,
+                     format_header, format_prompt_section, format_usage_info,
+                     stream_feedback_section)
+else:
+    # Running as a script (python src/detection_test_script.py) or installed as
+    # top-level modules; these rebind the same names, so mypy's no-redef is expected
+    from detection_core import (  # type: ignore[no-redef]
+        generate_batch_prompt, generate_detection_prompt, split_batch_feedback,
+        validate_api_key, validate_detection_config)
+    from ui import (  # type: ignore[no-redef]
+        emit, format_detection_info, format_feedback_section, format_footer, format_header,
+        format_prompt_section, format_usage_info, stream_feedback_section)
 
-def create_prompt_box(prompt: str, width: int = 80) -> str:
-    """Create a formatted prompt display box."""
-    box_top = "╔" + "═" * (width - 2) + "╗"
-    box_bottom = "╚" + "═" * (width - 2) + "╝"
-    
-    # Split prompt into lines that fit within width
-    lines = []
-    words = prompt.split()
-    current_line = ""
-    
-    for word in words:
-        if len(current_line + " " + word) <= width - 6:
-            current_line += (" " + word) if current_line else word
-        else:
-            if current_line:
-                lines.append(f"║ {current_line:<{width-4}} ║")
-            current_line = word
-    
-    if current_line:
-        lines.append(f"║ {current_line:<{width-4}} ║")
-    
-    return "\n".join([box_top] + lines + [box_bottom])
+# Help messages printed on the error paths
+_API_KEY_HELP = """Please set your Gemini API key:
+1. Get your API key from https://makersuite.google.com/app/apikey
+2. Set it as an environment variable: export GEMINI_API_KEY='your-api-key-here'
+3. Or create a .env file with: GEMINI_API_KEY=your-api-key-here
+4. Or pass it directly: --api-key your-api-key-here"""
 
-def create_feedback_section(feedback: str, width: int = 80) -> str:
-    """Create a formatted feedback section."""
-    box_top = "╭" + "─" * (width - 2) + "╮"
-    box_bottom = "╰" + "─" * (width - 2) + "╯"
-    
-    # Split feedback into numbered points
-    lines = feedback.strip().split('\n')
-    formatted_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if line:
-            # Check if it's a numbered point
-            if line.startswith(('1.', '2.', '3.')):
-                formatted_lines.append(f"│ {line:<{width-4}} │")
-            else:
-                formatted_lines.append(f"│ {line:<{width-4}} │")
-    
-    return "\n".join([box_top] + formatted_lines + [box_bottom])
-
-def print_header() -> None:
-    """Print the main application header."""
-    header = """
-╔══════════════════════════════════════════════════════════════════════════════╗
-║                    🔒 AI DETECTION VALIDATOR v1.0 🔒                        ║
-║                                                                              ║
-║              AI-Powered Cybersecurity Detection Framework                    ║
-║                    Powered by Google Gemini AI                              ║
-╚══════════════════════════════════════════════════════════════════════════════╝
-"""
-    print(header)
-
-def print_detection_info(config: Dict[str, Any]) -> None:
-    """Print detection information in a formatted way."""
-    print(create_section_header("📋 DETECTION CONFIGURATION", "━", 80))
-    print()
-    
-    # Create info boxes for each field
-    print(create_info_box("🎯 Title", config['title']))
-    print()
-    print(create_info_box("📝 Description", config['description']))
-    print()
-    print(create_info_box("🔍 Source Table", config['source_table']))
-    print()
-    print(create_info_box("💻 SQL Search Query", config['sql_search']))
-    print()
-
-def print_prompt_section(prompt: str, model: str) -> None:
-    """Print the generated prompt in a formatted way."""
-    print(create_section_header("🤖 AI PROMPT GENERATION", "━", 80))
-    print(f"📡 Sending request to '{model}' model...")
-    print()
-    print("📤 Generated Prompt:")
-    print(create_prompt_box(prompt))
-    print()
-
-def print_feedback_section(feedback: str) -> None:
-    """Print the AI feedback in a formatted way."""
-    print(create_section_header("🎯 AI FEEDBACK & RECOMMENDATIONS", "━", 80))
-    print(create_feedback_section(feedback))
-    print()
-
-def print_usage_info(response) -> None:
-    """Print token usage information."""
-    if hasattr(response, 'usage_metadata'):
-        usage = response.usage_metadata
-        print(create_section_header("📊 USAGE STATISTICS", "━", 80))
-        usage_box = f"Prompt Tokens: {usage.prompt_token_count} | Response Tokens: {usage.candidates_token_count}"
-        print(create_info_box("Token Usage", usage_box))
-        print()
-
-def print_footer() -> None:
-    """Print the application footer."""
-    footer = """
-╔══════════════════════════════════════════════════════════════════════════════╗
-║                              🎉 ANALYSIS COMPLETE 🎉                        ║
-║                                                                              ║
-║              Your detection has been analyzed by AI!                         ║
-║              Review the feedback above to improve your detection rules.      ║
-╚══════════════════════════════════════════════════════════════════════════════╝
-"""
-    print(footer)
-
-def validate_api_key(api_key):
-    """
-    Validate the API key format and length.
-    """
-    if not api_key:
-        return False, "API key is required"
-    
-    if len(api_key) < 20:
-        return False, "API key appears to be too short"
-    
-    # Remove the incorrect 'AI' prefix check as Google Gemini API keys don't have a standard format
-    return True, "API key format is valid"
+_MISSING_FIELDS_HELP = """Please ensure your config file contains all required fields:
+- title: Detection rule title
+- description: What the detection is looking for
+- sql_search: The SQL search query
+- source_table: The source log table to search"""
 
-def validate_detection_config(config):
+_MODEL_INIT_HELP = "Please check your API key and ensure '{model}' is a valid Gemini model name."
+
+_UNEXPECTED_RESPONSE_HELP = """Error: Unexpected response format from AI model
+Please try again or check your API configuration."""
+
+_CONNECTION_HELP = "Please check your API key and internet connection."
+
+# File extensions picked up from a detection directory
+_CONFIG_EXTENSIONS = ('.yml', '.yaml', '.json')
+
+def list_config_files(directory: str) -> List[str]:
     """
-    Validate that all required detection parameters are present.
+    Return the detection config files in a directory, sorted by name.
     """
-    required_fields = ['title', 'description', 'sql_search', 'source_table']
-    missing_fields = []
-    
-    for field in required_fields:
-        if field not in config or not config[field]:
-            missing_fields.append(field)
-    
-    if missing_fields:
-        return False, f"Missing required fields: {', '.join(missing_fields)}"
-    
-    return True, "All required fields present"
+    try:
+        names = os.listdir(directory)
+    except OSError as e:
+        print(f"Error: Cannot read detection directory '{directory}': {e}")
+        sys.exit(1)
+
+    config_files = sorted(os.path.join(directory, name) for name in names
+                          if name.lower().endswith(_CONFIG_EXTENSIONS))
+    if not config_files:
+        print(f"Error: No .yml, .yaml or .json detection configs found in '{directory}'.")
+        sys.exit(1)
+    return config_files
 
-def generate_detection_prompt(config):
+def load_detection_config(config_file: str) -> Dict[str, Any]:
     """
-    Generate the cybersecurity detection improvement prompt.
+    Load a detection config from a YAML or JSON file and validate its required fields.
     """
-    prompt = (
-        f"I am a cyber security detection engineer developing a new detection using spark SQL for databricks "
-        f"to search across a cyber datalake. I am looking for you to provide the top three most insightful "
-        f"feedbacks you can to improve my detections coverage and quality to maximize True positive outcomes. "
-        f"Based on the description '{config['description']}' and considering the source log table '{config['source_table']}', "
-        f"please help me improve my title from '{config['title']}' and SQL search '{config['sql_search']}' with your top three feedback tips. "
-        f"Please keep them under two sentences long."
-    )
-    return prompt
+    try:
+        # The parsers read the raw buffer directly, so skip the text-mode decode
+        with open(config_file, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        print(f"Error: Config file not found at '{config_file}'.")
+        sys.exit(1)
+
+    if config_file.lower().endswith('.json'):
+        try:
+            config = _json.loads(data)
+        except ValueError as e:
+            print(f"Error parsing JSON file: {e}")
+            sys.exit(1)
+    else:
+        try:
+            config = yaml.load(data, Loader=_YamlLoader)
+        except (yaml.YAMLError, ValueError) as e:
+            # Invalid timestamps such as 2023-13-45 surface as ValueError
+            print(f"Error parsing YAML file: {e}")
+            sys.exit(1)
+
+    # Validate detection configuration
+    is_valid, validation_message = validate_detection_config(config)
+    if not is_valid:
+        print(f"Error: {validation_message}")
+        print(_MISSING_FIELDS_HELP)
+        sys.exit(1)
 
-def main():
+    return config
+
+@functools.lru_cache(maxsize=None)
+def _event_loop() -> asyncio.AbstractEventLoop:
     """
-    Parses command-line arguments, initializes Gemini AI, and gets AI feedback
-    for cybersecurity detection improvement using values from a YAML file.
+    Return the event loop shared by every batch in this process.
+
+    The SDK caches its async gRPC client, whose HTTP/2 channel is bound to the
+    loop it was first used on. Reusing one loop keeps that pooled connection
+    valid across batches instead of tying it to a loop that asyncio.run() closes.
+    """
+    return asyncio.new_event_loop()
+
+async def generate_feedback_batch(model, prompts: List[str]) -> List[Any]:
+    """
+    Send all prompts to the model concurrently and return the responses in order.
+    """
+    return await asyncio.gather(*(model.generate_content_async(prompt) for prompt in prompts))
+
+# genai.configure is process-global, so models are only reused while the key they
+# were built under is still the configured one.
+_configured_api_key: Optional[str] = None
+
+@functools.lru_cache(maxsize=4)
+def _build_model(model_name: str):
+    """Return a model for the currently configured Gemini key."""
+    return genai.GenerativeModel(model_name)
+
+def _get_model(api_key: str, model_name: str):
+    """
+    Configure Gemini when the key changes and return a model, reusing it for the same
+    key and model name.
+    """
+    global _configured_api_key
+    if api_key != _configured_api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+        _build_model.cache_clear()
+    return _build_model(model_name)
+
+def _cache_dir() -> str:
+    """Return the directory used to cache model responses."""
+    configured = os.environ.get("DETECTION_AI_CACHE_DIR")
+    if configured:
+        return os.path.expanduser(configured)
+    return os.path.join(os.path.expanduser("~"), ".cache", "ai-detection-validator")
+
+def _cache_path(key: str) -> str:
+    """Return the cache file path for a cache key."""
+    return os.path.join(_cache_dir(), key + ".txt")
+
+def cache_key(model_name: str, prompt: str) -> str:
+    """
+    Build the cache key for a prompt sent to a specific model.
+    """
+    return hashlib.sha256((model_name + "\x00" + prompt).encode("utf-8")).hexdigest()
+
+def read_cached_feedback(key: str) -> Optional[str]:
+    """
+    Return the cached response text for a key, or None on a cache miss.
+    """
+    try:
+        with open(_cache_path(key), 'r', encoding='utf-8') as file:
+            return file.read()
+    except OSError:
+        return None
+
+def write_cached_feedback(key: str, feedback: str) -> None:
+    """
+    Atomically store response text in the cache. Failures are not fatal.
+    """
+    try:
+        os.makedirs(_cache_dir(), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=_cache_dir(), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(feedback)
+            os.replace(tmp_path, _cache_path(key))
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        print(f"Warning: could not write response cache: {e}")
+
+# Semantic cache settings: embedding model and minimum cosine similarity for a hit
+_SEMANTIC_EMBEDDING_MODEL = "models/text-embedding-004"
+_SEMANTIC_THRESHOLD = 0.95
+
+# Only the per-detection fields are embedded; the prompt's template wording is
+# shared by every detection and would dominate the similarity score
+_SEMANTIC_FIELDS = ("title", "description", "sql_search", "source_table")
+
+def _load_numpy():
+    """Return the numpy module, or None when the optional dependency is missing."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def _semantic_index_path(model_name: str) -> str:
+    """
+    Return the semantic cache index path for a model. The embedding model and
+    embedded fields are part of the key, since vectors from a different
+    embedding setup can't be compared.
+    """
+    key = "\0".join([model_name, _SEMANTIC_EMBEDDING_MODEL, *_SEMANTIC_FIELDS])
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(_cache_dir(), "semantic", name + ".npz")
+
+def embed_detection(config: Dict[str, Any]) -> Optional[List[float]]:
+    """
+    Embed a detection's fields for the semantic cache. Returns None if embedding fails.
+    """
+    content = "\n".join(f"{field}: {config[field]}" for field in _SEMANTIC_FIELDS)
+    try:
+        result = genai.embed_content(model=_SEMANTIC_EMBEDDING_MODEL, content=content)
+        return result["embedding"]
+    except Exception as e:
+        print(f"Warning: could not embed detection for semantic cache: {e}")
+        return None
+
+def find_similar_feedback(model_name: str, embedding: List[float]) -> Optional[str]:
+    """
+    Return the cached response for the most similar previous prompt, or None
+    when no stored prompt reaches the similarity threshold.
+    """
+    np = _load_numpy()
+    try:
+        with np.load(_semantic_index_path(model_name)) as index:
+            vectors = index["vectors"]
+            responses = index["responses"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+    # An index of a different shape or a zero vector can't be scored; treat it as a miss
+    query = np.asarray(embedding, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) == 0 or vectors.shape[1] != query.shape[0]:
+        return None
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+    if not norms.all():
+        return None
+    scores = vectors @ query / norms
+    best = int(np.argmax(scores))
+    if scores[best] > _SEMANTIC_THRESHOLD:
+        return str(responses[best])
+    return None
+
+def store_semantic_feedback(model_name: str, embedding: List[float], feedback: str) -> None:
+    """
+    Append a prompt embedding and its response to the semantic cache index.
+    """
+    np = _load_numpy()
+    path = _semantic_index_path(model_name)
+    vector = np.asarray([embedding], dtype=np.float32)
+    try:
+        with np.load(path) as index:
+            vectors = np.concatenate([index["vectors"], vector])
+            responses = np.concatenate([index["responses"], [feedback]])
+    except (OSError, KeyError, ValueError):
+        vectors, responses = vector, np.asarray([feedback])
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(file, vectors=vectors, responses=responses)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError):
+            os.unlink(tmp_path)
+            raise
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not write semantic cache: {e}")
+
+def review_detection_batch(model, model_name: str, configs: List[Dict[str, Any]], use_cache: bool) -> None:
+    """
+    Review several detections with a single combined request and print the
+    feedback for each detection.
+    """
+    prompt = generate_batch_prompt(configs)
+    key = cache_key(model_name, prompt)
+    feedback = read_cached_feedback(key) if use_cache else None
+    response = None
+    output = [format_header(), format_prompt_section(prompt, model_name, sending=feedback is None)]
+
+    if feedback is None:
+        # Show the request before waiting on the model
+        emit(*output)
+        output = []
+        try:
+            response = model.generate_content(prompt)
+
+            # Validate the response structure before using it
+            if not response or not hasattr(response, 'text'):
+                print(_UNEXPECTED_RESPONSE_HELP)
+                sys.exit(1)
+
+            feedback = response.text
+        except Exception as e:
+            print(f"Error getting a response from the model: {e}")
+            print(_CONNECTION_HELP)
+            sys.exit(1)
+
+        if use_cache:
+            write_cached_feedback(key, feedback)
+    else:
+        output += ["♻️  Using cached response (pass --no-cache to refresh)", ""]
+
+    sections = split_batch_feedback(feedback, len(configs))
+    if sections is None:
+        # The response didn't use recognisable per-detection headings; show it whole
+        output += [format_detection_info(config) for config in configs]
+        output.append(format_feedback_section(feedback))
+    else:
+        for config, section in zip(configs, sections):
+            output += [format_detection_info(config), format_feedback_section(section)]
+
+    # Add usage information if available
+    usage_info = format_usage_info(response) if response is not None else ""
+    if usage_info:
+        output.append(usage_info)
+
+    emit(*output, format_footer())
+
+# Gemini model used when --model is not given
+_DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Options understood by the argv fast path, mapped to their attribute names
+_FAST_VALUE_OPTIONS = {"--yaml-dir": "yaml_dir", "--model": "model", "--api-key": "api_key"}
+_FAST_FLAG_OPTIONS = {"--no-cache": "no_cache", "--semantic-cache": "semantic_cache"}
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line argument parser.
     """
     # Create an argument parser to handle command-line options
-    parser = argparse.ArgumentParser(description="Get AI-powered feedback for cybersecurity detection improvement using a YAML config file.")
-    parser.add_argument("--yaml-file", type=str, required=True,
-                        help="Path to the YAML file containing detection parameters.")
-    parser.add_argument("--model", type=str, default="gemini-1.5-flash",
+    parser = argparse.ArgumentParser(description="Get AI-powered feedback for cybersecurity detection improvement using a YAML or JSON config file.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--yaml-file", type=str, nargs="+",
+                        help="Path to one or more YAML (or .json) files containing detection parameters. "
+                             "Multiple files are sent to the model concurrently.")
+    source.add_argument("--yaml-dir", type=str,
+                        help="Directory of YAML/JSON detection configs to review together in a single request.")
+    parser.add_argument("--model", type=str, default=_DEFAULT_MODEL,
                         help="Gemini model to use (default: gemini-1.5-flash)")
     parser.add_argument("--api-key", type=str,
                         help="Gemini API key (overrides environment variable)")
-    args = parser.parse_args()
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always query the model instead of reusing cached responses")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="Also reuse responses for near-identical prompts (requires numpy)")
+    return parser
+
+@functools.lru_cache(maxsize=None)
+def _get_parser() -> argparse.ArgumentParser:
+    """
+    Return the argument parser, built on first use and reused by later main() calls.
+    """
+    return build_parser()
+
+def _parse_args_fast(argv: List[str]) -> Optional[argparse.Namespace]:
+    """
+    Parse the common space-separated invocations without building the argparse
+    parser. Returns None for anything else (--help, '=' syntax, abbreviations,
+    unknown or malformed options) so argparse can handle it and report errors.
+    """
+    values: Dict[str, Any] = {"yaml_file": None, "yaml_dir": None, "model": _DEFAULT_MODEL,
+                              "api_key": None, "no_cache": False, "semantic_cache": False}
+    index = 0
+    while index < len(argv):
+        option = argv[index]
+        index += 1
+        if option in _FAST_FLAG_OPTIONS:
+            values[_FAST_FLAG_OPTIONS[option]] = True
+        elif option in _FAST_VALUE_OPTIONS:
+            if index == len(argv) or argv[index].startswith("-"):
+                return None
+            values[_FAST_VALUE_OPTIONS[option]] = argv[index]
+            index += 1
+        elif option == "--yaml-file":
+            start = index
+            while index < len(argv) and not argv[index].startswith("-"):
+                index += 1
+            if index == start:
+                return None
+            values["yaml_file"] = argv[start:index]
+        else:
+            return None
+
+    # Exactly one config source is required
+    if (values["yaml_file"] is None) == (values["yaml_dir"] is None):
+        return None
+    return argparse.Namespace(**values)
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Parses command-line arguments, initializes Gemini AI, and gets AI feedback
+    for cybersecurity detection improvement using values from one or more config files.
+    argv defaults to sys.argv[1:].
+    """
+    # Parse the common invocations directly; fall back to argparse for the rest
+    args = _parse_args_fast(sys.argv[1:] if argv is None else argv)
+    if args is None:
+        args = _get_parser().parse_args(argv)
 
     # Get API key from command line argument or environment variable
     api_key = args.api_key or os.environ.get("GEMINI_API_KEY")
     
     # Validate API key
     is_valid, validation_message = validate_api_key(api_key)
-    if not is_valid:
+    if not is_valid or api_key is None:
         print(f"Error: {validation_message}")
-        print("Please set your Gemini API key:")
-        print("1. Get your API key from https://makersuite.google.com/app/apikey")
-        print("2. Set it as an environment variable: export GEMINI_API_KEY='your-api-key-here'")
-        print("3. Or create a .env file with: GEMINI_API_KEY=your-api-key-here")
-        print("4. Or pass it directly: --api-key your-api-key-here")
+        print(_API_KEY_HELP)
         sys.exit(1)
 
-    # Configure Gemini AI
+    # Load and validate every detection config up front
+    batch_review = args.yaml_dir is not None
+    config_files = list_config_files(args.yaml_dir) if batch_review else args.yaml_file
+    configs = [load_detection_config(config_file) for config_file in config_files]
+
+    # Configure Gemini AI and initialize the generative model
     try:
-        genai.configure(api_key=api_key)
+        model = _get_model(api_key, args.model)
         print(f"Using Gemini AI model: {args.model}")
     except Exception as e:
-        print(f"Error configuring Gemini AI: {e}")
+        print(f"Error initializing Gemini AI model '{args.model}': {e}")
+        print(_MODEL_INIT_HELP.format(model=args.model))
         sys.exit(1)
 
-    # Load and parse the YAML file
-    try:
-        with open(args.yaml_file, 'r') as file:
-            config = yaml.safe_load(file)
-    except FileNotFoundError:
-        print(f"Error: YAML file not found at '{args.yaml_file}'.")
-        sys.exit(1)
-    except yaml.YAMLError as e:
-        print(f"Error parsing YAML file: {e}")
-        sys.exit(1)
+    if batch_review:
+        if args.semantic_cache:
+            print("Warning: --semantic-cache is not supported with --yaml-dir; "
+                  "only exact-match cached responses are reused.")
+        review_detection_batch(model, args.model, configs, use_cache=not args.no_cache)
+        return
 
-    # Validate detection configuration
-    is_valid, validation_message = validate_detection_config(config)
-    if not is_valid:
-        print(f"Error: {validation_message}")
-        print("Please ensure your YAML file contains all required fields:")
-        print("- title: Detection rule title")
-        print("- description: What the detection is looking for")
-        print("- sql_search: The SQL search query")
-        print("- source_table: The source log table to search")
-        sys.exit(1)
+    # Generate the detection improvement prompts
+    prompts = [generate_detection_prompt(config) for config in configs]
+    batch = len(prompts) > 1
+    output = [format_header()]
 
-    # Generate the detection improvement prompt
-    final_prompt = generate_detection_prompt(config)
+    # Reuse responses for prompts that were already sent to this model
+    keys = [cache_key(args.model, prompt) for prompt in prompts]
+    feedback: List[Optional[str]] = [None if args.no_cache else read_cached_feedback(key) for key in keys]
 
-    # Initialize the generative model
-    try:
-        model = genai.GenerativeModel(args.model)
-    except Exception as e:
-        print(f"Error initializing model '{args.model}': {e}")
-        print(f"Please ensure '{args.model}' is a valid Gemini model name.")
-        sys.exit(1)
+    # Fall back to the response for the most similar previous detection
+    embeddings = {}
+    if args.semantic_cache and not args.no_cache:
+        if _load_numpy() is None:
+            print("Warning: --semantic-cache requires numpy (pip install numpy); continuing without it.")
+        else:
+            for index, text in enumerate(feedback):
+                if text is None:
+                    embedding = embed_detection(configs[index])
+                    if embedding is not None:
+                        embeddings[index] = embedding
+                        feedback[index] = find_similar_feedback(args.model, embedding)
 
-    print_header()
-    print_detection_info(config)
-    print_prompt_section(final_prompt, args.model)
+    pending = [index for index, text in enumerate(feedback) if text is None]
+    responses = [None] * len(prompts)
 
     try:
-        # Generate content from the model
-        response = model.generate_content(final_prompt)
+        if batch:
+            if pending:
+                # Overlap the network round trips for every uncached detection
+                output += [f"📡 Sending {len(pending)} detections to '{args.model}' concurrently...", ""]
+                emit(*output)
+                output = []
+                results = _event_loop().run_until_complete(
+                    generate_feedback_batch(model, [prompts[index] for index in pending]))
+                for index, response in zip(pending, results):
+                    responses[index] = response
+        else:
+            # Show the request before waiting on the model
+            emit(*output, format_detection_info(configs[0]),
+                 format_prompt_section(prompts[0], args.model, sending=bool(pending)))
+            output = []
+            if pending:
+                # A streamed response only exposes .text once it has been fully
+                # iterated, so its content is validated after the stream ends
+                response = model.generate_content(prompts[0], stream=True)
+                if response is None:
+                    print(_UNEXPECTED_RESPONSE_HELP)
+                    sys.exit(1)
 
-        # Validate the response structure before using it
-        if not response or not hasattr(response, 'text'):
-            print("Error: Unexpected response format from AI model")
-            print("Please try again or check your API configuration.")
-            sys.exit(1)
+                # Print the feedback as the model generates it
+                feedback[0] = stream_feedback_section(chunk.text for chunk in response)
+                if not feedback[0]:
+                    print(_UNEXPECTED_RESPONSE_HELP)
+                    sys.exit(1)
+                responses[0] = response
+
+        for index, (config, prompt) in enumerate(zip(configs, prompts)):
+            if batch:
+                output += [format_detection_info(config),
+                           format_prompt_section(prompt, args.model, sending=index in pending)]
+
+            response = responses[index]
+            text = feedback[index]
+            if response is None and text is not None:
+                output += ["♻️  Using cached response (pass --no-cache to refresh)", "",
+                           format_feedback_section(text)]
+                continue
+
+            if text is None:
+                # Validate the response structure before using it
+                if not response or not hasattr(response, 'text'):
+                    emit(*output)
+                    print(_UNEXPECTED_RESPONSE_HELP)
+                    sys.exit(1)
+
+                # Add the model's response text
+                text = feedback[index] = response.text
+                output.append(format_feedback_section(text))
+
+            if not args.no_cache:
+                write_cached_feedback(keys[index], text)
+            if index in embeddings:
+                store_semantic_feedback(args.model, embeddings[index], text)
+
+            # Add usage information if available; streamed responses fill it in at the end
+            usage_info = format_usage_info(response)
+            if usage_info:
+                output.append(usage_info)
 
-        # Print the model's response text
-        print_feedback_section(response.text)
-        
-        # Print usage information if available
-        print_usage_info(response)
-        
     except Exception as e:
+        emit(*output)
         print(f"Error getting a response from the model: {e}")
-        print("Please check your API key and internet connection.")
+        print(_CONNECTION_HELP)
         sys.exit(1)
 
-    print_footer()
+    emit(*output, format_footer())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,181 @@
+# =============================================================================
+# AI Detection Validator - Terminal output formatting
+#
+# Box drawing and section formatting helpers used by detection_test_script
+# to render detection details, prompts and AI feedback.
+# =============================================================================
+
+import sys
+import textwrap
+from typing import Any, Dict, Iterable, List
+
+def _edge(left: str, fill: str, right: str, width: int) -> str:
+    """Build one horizontal box edge of the given total width."""
+    return left + fill * (width - 2) + right
+
+# Box edges for the default 80-column width, built once at import
+_BOX_80 = {
+    "top": _edge("┌", "─", "┐", 80),
+    "bot": _edge("└", "─", "┘", 80),
+    "mid": _edge("├", "─", "┤", 80),
+    "prompt_top": _edge("╔", "═", "╗", 80),
+    "prompt_bot": _edge("╚", "═", "╝", 80),
+    "fb_top": _edge("╭", "─", "╮", 80),
+    "fb_bot": _edge("╰", "─", "╯", 80),
+}
+
+def create_border(text: str, char: str = "═", width: int = 80) -> str:
+    """Create a bordered text block."""
+    border = char * width
+    return f"{border}\n{text}\n{border}"
+
+def create_section_header(title: str, char: str = "━", width: int = 80) -> str:
+    """Create a section header with decorative elements."""
+    padding = (width - len(title) - 4) // 2
+    left_pad = char * padding
+    right_pad = char * (width - len(title) - 4 - padding)
+    return f"{left_pad} {title} {right_pad}"
+
+def _wrap_text(text: str, width: int) -> List[str]:
+    """Word-wrap text to the given width, collapsing runs of whitespace."""
+    return textwrap.wrap(" ".join(text.split()), width=width,
+                         break_long_words=False, break_on_hyphens=False)
+
+def create_info_box(title: str, content: str, width: int = 80) -> str:
+    """Create a formatted information box."""
+    box_top = _BOX_80["top"] if width == 80 else _edge("┌", "─", "┐", width)
+    box_bottom = _BOX_80["bot"] if width == 80 else _edge("└", "─", "┘", width)
+    divider = _BOX_80["mid"] if width == 80 else _edge("├", "─", "┤", width)
+    
+    # Format the title
+    title_line = f"│ {title:<{width-4}} │"
+    
+    # Format the content with word wrapping
+    content_lines = [f"│ {line:<{width-4}} │" for line in _wrap_text(content, width - 6)]
+    
+    return "\n".join([box_top, title_line, divider] + content_lines + [box_bottom])
+
+def create_prompt_box(prompt: str, width: int = 80) -> str:
+    """Create a formatted prompt display box."""
+    box_top = _BOX_80["prompt_top"] if width == 80 else _edge("╔", "═", "╗", width)
+    box_bottom = _BOX_80["prompt_bot"] if width == 80 else _edge("╚", "═", "╝", width)
+    
+    # Split prompt into lines that fit within width
+    lines = [f"║ {line:<{width-4}} ║" for line in _wrap_text(prompt, width - 6)]
+    
+    return "\n".join([box_top] + lines + [box_bottom])
+
+def _feedback_lines(lines: Iterable[str], width: int) -> List[str]:
+    """Wrap each feedback point so long lines stay inside the box."""
+    return [
+        f"│ {wrapped:<{width-4}} │"
+        for line in lines
+        for wrapped in _wrap_text(line, width - 6)
+    ]
+
+def create_feedback_section(feedback: str, width: int = 80) -> str:
+    """Create a formatted feedback section."""
+    box_top = _BOX_80["fb_top"] if width == 80 else _edge("╭", "─", "╮", width)
+    box_bottom = _BOX_80["fb_bot"] if width == 80 else _edge("╰", "─", "╯", width)
+    
+    formatted_lines = _feedback_lines(feedback.strip().split('\n'), width)
+    
+    return "\n".join([box_top] + formatted_lines + [box_bottom])
+
+def format_header() -> str:
+    """Format the main application header."""
+    return """
+╔══════════════════════════════════════════════════════════════════════════════╗
+║                    🔒 AI DETECTION VALIDATOR v1.0 🔒                        ║
+║                                                                              ║
+║              AI-Powered Cybersecurity Detection Framework                    ║
+║                    Powered by Google Gemini AI                              ║
+╚══════════════════════════════════════════════════════════════════════════════╝
+"""
+
+def format_detection_info(config: Dict[str, Any]) -> str:
+    """Format detection information as a block of info boxes."""
+    return "\n".join([
+        create_section_header("📋 DETECTION CONFIGURATION", "━", 80),
+        "",
+        # Create info boxes for each field
+        create_info_box("🎯 Title", config['title']),
+        "",
+        create_info_box("📝 Description", config['description']),
+        "",
+        create_info_box("🔍 Source Table", config['source_table']),
+        "",
+        create_info_box("💻 SQL Search Query", config['sql_search']),
+        "",
+    ])
+
+def format_prompt_section(prompt: str, model: str, sending: bool = True) -> str:
+    """Format the generated prompt section, announcing the request unless it is served from cache."""
+    announce = [f"📡 Sending request to '{model}' model..."] if sending else []
+    return "\n".join([
+        create_section_header("🤖 AI PROMPT GENERATION", "━", 80),
+        *announce,
+        "",
+        "📤 Generated Prompt:",
+        create_prompt_box(prompt),
+        "",
+    ])
+
+def format_feedback_section(feedback: str) -> str:
+    """Format the AI feedback section."""
+    return "\n".join([
+        create_section_header("🎯 AI FEEDBACK & RECOMMENDATIONS", "━", 80),
+        create_feedback_section(feedback),
+        "",
+    ])
+
+def stream_feedback_section(chunks: Iterable[str], width: int = 80) -> str:
+    """
+    Write the AI feedback section while text chunks arrive and return the full text.
+    Each line is boxed and written as soon as it is complete.
+    """
+    box_top = _BOX_80["fb_top"] if width == 80 else _edge("╭", "─", "╮", width)
+    box_bottom = _BOX_80["fb_bot"] if width == 80 else _edge("╰", "─", "╯", width)
+
+    emit(create_section_header("🎯 AI FEEDBACK & RECOMMENDATIONS", "━", 80), box_top)
+    parts = []
+    partial = ""
+    for chunk in chunks:
+        parts.append(chunk)
+        *lines, partial = (partial + chunk).split('\n')
+        formatted_lines = _feedback_lines(lines, width)
+        if formatted_lines:
+            emit(*formatted_lines)
+
+    emit(*_feedback_lines([partial], width), box_bottom, "")
+    return "".join(parts)
+
+def format_usage_info(response) -> str:
+    """Format token usage information, or return an empty string if unavailable."""
+    if not hasattr(response, 'usage_metadata'):
+        return ""
+    usage = response.usage_metadata
+    usage_box = f"Prompt Tokens: {usage.prompt_token_count} | Response Tokens: {usage.candidates_token_count}"
+    return "\n".join([
+        create_section_header("📊 USAGE STATISTICS", "━", 80),
+        create_info_box("Token Usage", usage_box),
+        "",
+    ])
+
+def format_footer() -> str:
+    """Format the application footer."""
+    return """
+╔══════════════════════════════════════════════════════════════════════════════╗
+║                              🎉 ANALYSIS COMPLETE 🎉                        ║
+║                                                                              ║
+║              Your detection has been analyzed by AI!                         ║
+║              Review the feedback above to improve your detection rules.      ║
+╚══════════════════════════════════════════════════════════════════════════════╝
+"""
+
+def emit(*blocks: str) -> None:
+    """
+    Write formatted blocks to stdout with a single write, one block per line.
+    """
+    sys.stdout.write("".join(block + "\n" for block in blocks))
+    sys.stdout.flush()
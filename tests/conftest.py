@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import Mock, MagicMock
+
+
+@pytest.fixture(autouse=True)
+def isolated_response_cache(tmp_path, monkeypatch):
+    """Keep cached model responses out of the user's home directory."""
+    monkeypatch.setenv("DETECTION_AI_CACHE_DIR", str(tmp_path / "response-cache"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_model_cache(monkeypatch):
+    """Make every test configure Gemini and build its own (mocked) model."""
+    from src import detection_test_script
+
+    monkeypatch.setattr(detection_test_script, "_configured_api_key", None)
+    detection_test_script._build_model.cache_clear()
+    yield
+    detection_test_script._build_model.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def default_response():
+    """
+    Return the happy-path model response, built once and only read by tests.
+    It is a MagicMock so streamed runs can iterate it and receive its text as one chunk.
+    """
+    response = MagicMock(text="This is a test response.")
+    response.__iter__.return_value = [Mock(text=response.text)]
+    return response
+
+
+@pytest.fixture(scope="session")
+def write_config():
+    """
+    Return a helper that writes a flat detection config to a YAML file and returns its path.
+    Values are written as plain scalars, so config fixtures never import PyYAML.
+    """
+    def write(path, config):
+        with open(path, 'wb') as f:
+            f.write("".join(f"{key}: {value}\n" for key, value in config.items()).encode())
+        return str(path)
+    return write
+
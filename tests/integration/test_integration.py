@@ -1,54 +1,41 @@
 import pytest
 import os
-import tempfile
-import yaml
-from unittest.mock import patch, MagicMock
-from src.detection_test_script import main
+from unittest.mock import patch
+from src.detection_test_script import load_detection_config, main
 
 # Secure test constants - never use real API keys in tests
 TEST_API_KEY = "test_api_key_for_testing_purposes_only_12345"
 
+INTEGRATION_CONFIG = {
+    "title": "Suspicious PowerShell download",
+    "description": "Detects PowerShell downloading remote payloads",
+    "sql_search": "SELECT * FROM process_events WHERE command_line LIKE '%DownloadString%'",
+    "source_table": "process_events"
+}
+
+
+@pytest.fixture
+def config_file(tmp_path, write_config):
+    """Write the integration detection config into the test's tmp_path."""
+    return write_config(tmp_path / "integration_config.yml", INTEGRATION_CONFIG)
+
 
 class TestIntegration:
     """Integration tests for the Detection AI Script."""
     
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.temp_dir = tempfile.mkdtemp()
-        self.config_file = os.path.join(self.temp_dir, "integration_config.yml")
-        
-        # Create a test config file
-        test_config = {
-            "subject": "artificial intelligence",
-            "tone": "educational and informative",
-            "length": "150 words"
-        }
-        with open(self.config_file, 'w') as f:
-            yaml.dump(test_config, f)
-    
-    def teardown_method(self):
-        """Clean up test fixtures."""
-        import shutil
-        shutil.rmtree(self.temp_dir)
-    
     @patch('src.detection_test_script.genai.configure')
     @patch('src.detection_test_script.genai.GenerativeModel')
     @patch('src.detection_test_script.sys.exit')
-    def test_full_integration_flow(self, mock_exit, mock_model_class, mock_configure):
+    def test_full_integration_flow(self, mock_exit, mock_model_class, mock_configure, monkeypatch, config_file, default_response):
         """Test the complete integration flow from config to response."""
-        # Mock the model and response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "Artificial Intelligence (AI) represents a revolutionary field in computer science..."
-        mock_model.generate_content.return_value = mock_response
-        mock_model_class.return_value = mock_model
+        # Serve the shared default response from the patched model
+        mock_model = mock_model_class.return_value
+        mock_model.generate_content.return_value = default_response
         
         # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
         
-        # Mock sys.argv
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file]):
-            main()
+        main(['--yaml-file', config_file])
         
         # Verify the complete flow
         mock_configure.assert_called_once()
@@ -57,28 +44,22 @@ class TestIntegration:
         
         # Verify the prompt was constructed correctly
         call_args = mock_model.generate_content.call_args[0][0]
-        assert "artificial intelligence" in call_args
-        assert "educational and informative" in call_args
-        assert "150 words" in call_args
+        for value in INTEGRATION_CONFIG.values():
+            assert value in call_args
     
     @patch('src.detection_test_script.genai.configure')
     @patch('src.detection_test_script.genai.GenerativeModel')
     @patch('src.detection_test_script.sys.exit')
-    def test_integration_with_custom_model(self, mock_exit, mock_model_class, mock_configure):
+    def test_integration_with_custom_model(self, mock_exit, mock_model_class, mock_configure, monkeypatch, config_file, default_response):
         """Test integration with a custom Gemini model."""
-        # Mock the model and response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "Custom model response..."
-        mock_model.generate_content.return_value = mock_response
-        mock_model_class.return_value = mock_model
+        # Serve the shared default response from the patched model
+        mock_model = mock_model_class.return_value
+        mock_model.generate_content.return_value = default_response
         
         # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
         
-        # Mock sys.argv with custom model
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file, '--model', 'gemini-1.5-pro']):
-            main()
+        main(['--yaml-file', config_file, '--model', 'gemini-1.5-pro'])
         
         # Verify custom model was used
         mock_model_class.assert_called_once_with('gemini-1.5-pro')
@@ -86,68 +67,51 @@ class TestIntegration:
     @patch('src.detection_test_script.genai.configure')
     @patch('src.detection_test_script.genai.GenerativeModel')
     @patch('src.detection_test_script.sys.exit')
-    def test_integration_with_api_key_argument(self, mock_exit, mock_model_class, mock_configure):
+    def test_integration_with_api_key_argument(self, mock_exit, mock_model_class, mock_configure, monkeypatch, config_file, default_response):
         """Test integration with API key passed as command line argument."""
-        # Mock the model and response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "API key argument response..."
-        mock_model.generate_content.return_value = mock_response
-        mock_model_class.return_value = mock_model
+        # Serve the shared default response from the patched model
+        mock_model = mock_model_class.return_value
+        mock_model.generate_content.return_value = default_response
         
         # Remove environment variable
-        os.environ.pop('GEMINI_API_KEY', None)
+        monkeypatch.delenv('GEMINI_API_KEY', raising=False)
         
-        # Mock sys.argv with API key argument
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file, '--api-key', TEST_API_KEY]):
-            main()
+        main(['--yaml-file', config_file, '--api-key', TEST_API_KEY])
         
         # Verify API key was used
         mock_configure.assert_called_once()
         mock_model_class.assert_called_once_with('gemini-1.5-flash')
     
-    def test_config_file_parsing_integration(self):
+    def test_config_file_parsing_integration(self, config_file):
         """Test that the config file is properly parsed and integrated."""
-        # Read the config file
-        with open(self.config_file, 'r') as f:
-            config = yaml.safe_load(f)
-        
-        # Verify all required fields are present
-        assert 'subject' in config
-        assert 'tone' in config
-        assert 'length' in config
+        # Read the config file through the script's own (libyaml-backed) loader
+        config = load_detection_config(config_file)
         
-        # Verify field values
-        assert config['subject'] == 'artificial intelligence'
-        assert config['tone'] == 'educational and informative'
-        assert config['length'] == '150 words'
+        # Verify the fields round-trip unchanged
+        assert config == INTEGRATION_CONFIG
     
-    def test_environment_variable_integration(self):
+    def test_environment_variable_integration(self, monkeypatch):
         """Test environment variable integration."""
         # Set test environment variable
         test_key = TEST_API_KEY
-        os.environ['GEMINI_API_KEY'] = test_key
+        monkeypatch.setenv('GEMINI_API_KEY', test_key)
         
         # Verify environment variable is set
         assert os.environ.get('GEMINI_API_KEY') == test_key
-        
-        # Clean up
-        os.environ.pop('GEMINI_API_KEY', None)
     
     @patch('src.detection_test_script.genai.configure')
     @patch('src.detection_test_script.genai.GenerativeModel')
-    @patch('src.detection_test_script.sys.exit')
-    def test_error_handling_integration(self, mock_exit, mock_model_class, mock_configure):
+    @patch('src.detection_test_script.sys.exit', side_effect=SystemExit)
+    def test_error_handling_integration(self, mock_exit, mock_model_class, mock_configure, monkeypatch, config_file):
         """Test error handling integration."""
         # Mock genai.configure to raise an exception
         mock_configure.side_effect = Exception("Integration test error")
         
         # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
         
-        # Mock sys.argv
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file]):
-            main()
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', config_file])
         
         # Verify error handling worked
         mock_exit.assert_called_once_with(1)
@@ -1,92 +1,284 @@
 import pytest
 import os
-import tempfile
-import yaml
-from unittest.mock import patch, MagicMock
-from src.detection_test_script import validate_api_key, main
+import json
+from unittest.mock import Mock, MagicMock, AsyncMock
+from src import detection_test_script as dts
+from src.detection_test_script import (validate_api_key, main, _load_env, _parse_args_fast, build_parser,
+                                      split_batch_feedback)
+from src.ui import create_feedback_section
 
 # Secure test constants - never use real API keys in tests
 TEST_API_KEY = "test_api_key_for_testing_purposes_only_12345"
-INVALID_API_KEY = "invalid_key_for_testing"
+INVALID_API_KEY = "invalid_key"
+
+
+DETECTION_CONFIG = {
+    "title": "Test detection",
+    "description": "Detects test activity",
+    "sql_search": "SELECT * FROM security_logs",
+    "source_table": "security_logs"
+}
+
+
+@pytest.fixture(scope="session")
+def config_file(tmp_path_factory, write_config):
+    """Write a valid detection config once and share it across tests."""
+    return write_config(tmp_path_factory.mktemp("config") / "test_config.yml", DETECTION_CONFIG)
+
+
+@pytest.fixture(scope="session")
+def write_detection_config(write_config):
+    """Return a helper that writes the detection config, optionally retitled, to a path."""
+    def write(path, title=DETECTION_CONFIG["title"]):
+        return write_config(path, dict(DETECTION_CONFIG, title=title))
+    return write
+
+
+@pytest.fixture
+def mock_model(default_response):
+    """Return a fresh model mock that serves the default response."""
+    return Mock(**{"generate_content.return_value": default_response})
+
+
+@pytest.fixture
+def patched_genai(mocker, monkeypatch, mock_model):
+    """Patch Gemini to serve mock_model under TEST_API_KEY; return the configure and model-class mocks."""
+    mock_configure = mocker.patch.object(dts.genai, 'configure')
+    mock_model_class = mocker.patch.object(dts.genai, 'GenerativeModel', return_value=mock_model)
+    monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
+    return mock_configure, mock_model_class
+
+
+@pytest.fixture
+def mock_exit(mocker):
+    """Patch sys.exit so error paths raise SystemExit instead of ending the run."""
+    return mocker.patch.object(dts.sys, 'exit', side_effect=SystemExit)
+
 
 class TestValidateAPIKey:
     """Test cases for API key validation."""
-    
-    def test_valid_api_key(self):
-        """Test that a valid API key passes validation."""
-        valid_key = TEST_API_KEY
-        is_valid, message = validate_api_key(valid_key)
-        assert is_valid is True
-        assert message == "API key format is valid"
-    
-    def test_empty_api_key(self):
-        """Test that an empty API key fails validation."""
-        is_valid, message = validate_api_key("")
-        assert is_valid is False
-        assert message == "API key is required"
-    
-    def test_none_api_key(self):
-        """Test that None API key fails validation."""
-        is_valid, message = validate_api_key(None)
-        assert is_valid is False
-        assert message == "API key is required"
-    
-    def test_short_api_key(self):
-        """Test that a short API key fails validation."""
-        short_key = "AI123"
-        is_valid, message = validate_api_key(short_key)
-        assert is_valid is False
-        assert message == "API key appears to be too short"
-    
-    def test_valid_api_key_format(self):
-        """Test that a valid API key format passes validation."""
-        # Test with a key that meets the minimum length requirement
-        valid_key = "valid_api_key_that_is_long_enough_for_testing"
-        is_valid, message = validate_api_key(valid_key)
-        assert is_valid is True
-        assert message == "API key format is valid"
+
+    @pytest.mark.parametrize("api_key, expected", [
+        (TEST_API_KEY, (True, "API key format is valid")),
+        ("valid_api_key_that_is_long_enough_for_testing", (True, "API key format is valid")),
+        ("", (False, "API key is required")),
+        (None, (False, "API key is required")),
+        ("AI123", (False, "API key appears to be too short")),
+        ("x" * 19, (False, "API key appears to be too short")),
+        ("x" * 20, (True, "API key format is valid")),
+    ], ids=["test-key", "long-key", "empty", "none", "short", "one-below-minimum", "minimum"])
+    def test_validate_api_key(self, api_key, expected):
+        """Test API key validation results for each kind of key."""
+        assert validate_api_key(api_key) == expected
+
+
+class TestParseArgs:
+    """Test cases for command-line argument parsing."""
+
+    @pytest.mark.parametrize("argv", [
+        ['--yaml-file', 'a.yml'],
+        ['--yaml-file', 'a.yml', 'b.json', '--model', 'gemini-1.5-pro'],
+        ['--api-key', TEST_API_KEY, '--yaml-file', 'a.yml', '--no-cache'],
+        ['--yaml-dir', 'config', '--semantic-cache', '--model', 'm1', '--model', 'm2'],
+    ])
+    def test_fast_path_matches_argparse(self, argv):
+        """Test that the fast path produces the same arguments as argparse."""
+        assert vars(_parse_args_fast(argv)) == vars(build_parser().parse_args(argv))
+
+    @pytest.mark.parametrize("argv", [
+        [],
+        ['--help'],
+        ['--yaml-file'],
+        ['--yaml-file=a.yml'],
+        ['--yaml-file', 'a.yml', '--yaml-dir', 'config'],
+        ['--yaml-file', 'a.yml', '--model'],
+        ['--yaml-file', 'a.yml', '--unknown'],
+    ])
+    def test_fast_path_defers_to_argparse(self, argv):
+        """Test that unusual invocations fall back to argparse."""
+        assert _parse_args_fast(argv) is None
+
+
+class TestSplitBatchFeedback:
+    """Test cases for splitting a combined --yaml-dir response."""
+
+    @pytest.mark.parametrize("feedback", [
+        "### Detection 1\nFirst feedback.\n### Detection 2\nSecond feedback.",
+        "**Detection 1**\nFirst feedback.\n\n**Detection 2:** Second feedback.",
+        "Detection 1:\nFirst feedback.\nDetection 2: Second feedback.",
+        "## **Detection 1 - Suspicious_PowerShell**\nFirst feedback.\nDetection 2\nSecond feedback.",
+    ], ids=["markdown", "bold", "plain", "mixed"])
+    def test_splits_recognised_headings(self, feedback):
+        """Test each heading style yields one section per detection."""
+        assert split_batch_feedback(feedback, 2) == ["First feedback.", "Second feedback."]
+
+    def test_missing_section(self):
+        """Test a detection without a section gets a placeholder."""
+        assert split_batch_feedback("### Detection 2\nSecond feedback.", 2) == [
+            "No feedback was returned for this detection.", "Second feedback."]
+
+    def test_no_headings(self):
+        """Test a response without any detection heading is not split."""
+        assert split_batch_feedback("1. Tighten the SQL filter.\nDetection 1 is fine.", 2) is None
+
+
+class TestFeedbackSection:
+    """Test cases for boxing model feedback."""
+
+    @pytest.mark.parametrize("width", [80, 60])
+    def test_long_line_wraps_inside_box(self, width):
+        """Test a feedback line longer than the box splits into several boxed lines."""
+        feedback = ("1. Restrict the search to process creation events and exclude signed "
+                    "administrative tooling so the detection does not fire on routine patching.")
+        assert len(feedback) > 74
+
+        lines = create_feedback_section(feedback, width).split("\n")
+
+        body = lines[1:-1]
+        assert len(body) > 1
+        assert all(len(line) <= width for line in lines)
+        assert all(line.startswith("│ ") and line.endswith(" │") for line in body)
+        assert " ".join(line[2:-2].strip() for line in body) == feedback
+
+
+class TestLoadEnv:
+    """Test cases for .env file loading."""
+
+    def test_load_env_file(self, tmp_path, monkeypatch):
+        """Test that .env values are loaded without overriding existing variables."""
+        env_file = tmp_path / ".env"
+        env_file.write_text(
+            "# comment line\n"
+            "GEMINI_API_KEY=\"quoted_value\"\n"
+            "export DETECTION_CONFIG=example_config.yml\n"
+            "GEMINI_MODEL=from_file\n"
+            "not a variable\n"
+        )
+        # _load_env writes os.environ directly, so give it a copy that is discarded afterwards
+        monkeypatch.setattr(os, 'environ', os.environ.copy())
+        monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+        monkeypatch.delenv('DETECTION_CONFIG', raising=False)
+        monkeypatch.setenv('GEMINI_MODEL', 'from_environment')
+
+        _load_env(str(env_file))
+
+        assert os.environ['GEMINI_API_KEY'] == "quoted_value"
+        assert os.environ['DETECTION_CONFIG'] == "example_config.yml"
+        assert os.environ['GEMINI_MODEL'] == "from_environment"
+
+    @pytest.mark.parametrize("line, expected", [
+        ("KEY=abc123  # my key", "abc123"),
+        ("KEY=\"abc123\"  # my key", "abc123"),
+        ("KEY=\"abc #123\"", "abc #123"),
+        ("KEY=\"abc # x\"  # note", "abc # x"),
+        ("KEY=abc#123", "abc#123"),
+        ("KEY='single'", "single"),
+        ("KEY=\"x\"y'", "\"x\"y'"),
+        ("KEY=\"unterminated", "\"unterminated"),
+    ], ids=["inline-comment", "quoted-then-comment", "hash-in-quotes", "hash-in-quotes-then-comment",
+            "hash-in-value", "single-quotes", "mismatched-quotes", "unterminated-quote"])
+    def test_load_env_value_parsing(self, tmp_path, monkeypatch, line, expected):
+        """Test quote and inline comment handling for .env values."""
+        env_file = tmp_path / ".env"
+        env_file.write_text(line + "\n")
+        monkeypatch.setattr(os, 'environ', os.environ.copy())
+        monkeypatch.delenv('KEY', raising=False)
+
+        _load_env(str(env_file))
+
+        assert os.environ['KEY'] == expected
+
+    def test_load_env_skips_non_utf8_lines(self, tmp_path, monkeypatch):
+        """Test that undecodable lines are skipped without failing the whole file."""
+        env_file = tmp_path / ".env"
+        env_file.write_bytes(b"BAD_VALUE=caf\xe9\nGOOD_VALUE=loaded\n")
+        monkeypatch.setattr(os, 'environ', os.environ.copy())
+        monkeypatch.delenv('BAD_VALUE', raising=False)
+        monkeypatch.delenv('GOOD_VALUE', raising=False)
+
+        _load_env(str(env_file))
+
+        assert 'BAD_VALUE' not in os.environ
+        assert os.environ['GOOD_VALUE'] == "loaded"
+
+    def test_load_env_missing_file(self, tmp_path):
+        """Test that a missing .env file is ignored."""
+        _load_env(str(tmp_path / "missing.env"))
+
+
+class TestCacheDir:
+    """Test cases for locating the response cache."""
+
+    def test_cache_dir_expands_home(self, tmp_path, monkeypatch):
+        """Test a '~' in DETECTION_AI_CACHE_DIR resolves to the home directory."""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        monkeypatch.setenv('DETECTION_AI_CACHE_DIR', '~/.cache/ai-detection-validator')
+
+        assert dts._cache_dir() == str(tmp_path / ".cache" / "ai-detection-validator")
+
+
+class TestGetModel:
+    """Test cases for reusing configured Gemini models."""
+
+    def test_reuses_model_for_same_key(self, mocker):
+        """Test the same key and model name configure Gemini once and share a model."""
+        mock_configure = mocker.patch.object(dts.genai, 'configure')
+        mocker.patch.object(dts.genai, 'GenerativeModel', side_effect=lambda name: Mock())
+
+        assert dts._get_model(TEST_API_KEY, "gemini-1.5-flash") is dts._get_model(TEST_API_KEY, "gemini-1.5-flash")
+        mock_configure.assert_called_once_with(api_key=TEST_API_KEY)
+
+    def test_reconfigures_when_key_changes(self, mocker):
+        """Test switching keys back and forth reconfigures Gemini and rebuilds the model."""
+        other_key = TEST_API_KEY[::-1]
+        mock_configure = mocker.patch.object(dts.genai, 'configure')
+        mocker.patch.object(dts.genai, 'GenerativeModel', side_effect=lambda name: Mock())
+
+        first = dts._get_model(TEST_API_KEY, "gemini-1.5-flash")
+        dts._get_model(other_key, "gemini-1.5-flash")
+        again = dts._get_model(TEST_API_KEY, "gemini-1.5-flash")
+
+        assert again is not first
+        assert [call.kwargs["api_key"] for call in mock_configure.call_args_list] == [
+            TEST_API_KEY, other_key, TEST_API_KEY]
+
+
+class TestSemanticCache:
+    """Test cases for the semantic response cache index."""
+
+    @pytest.fixture(autouse=True)
+    def _numpy(self):
+        pytest.importorskip("numpy")
+
+    def test_mismatched_vector_length_is_a_miss(self):
+        """Test an index built with another vector length is ignored, not a crash."""
+        dts.store_semantic_feedback("gemini-1.5-flash", [1.0, 0.0], "Stored feedback.")
+
+        assert dts.find_similar_feedback("gemini-1.5-flash", [1.0, 0.0, 0.0]) is None
+        assert dts.find_similar_feedback("gemini-1.5-flash", [1.0, 0.0]) == "Stored feedback."
+
+    def test_zero_vector_is_a_miss(self):
+        """Test a zero-length embedding never matches."""
+        dts.store_semantic_feedback("gemini-1.5-flash", [1.0, 0.0], "Stored feedback.")
+
+        assert dts.find_similar_feedback("gemini-1.5-flash", [0.0, 0.0]) is None
+
+    def test_index_is_keyed_by_embedding_model(self, monkeypatch):
+        """Test changing the embedding model starts a separate index."""
+        dts.store_semantic_feedback("gemini-1.5-flash", [1.0, 0.0], "Stored feedback.")
+        monkeypatch.setattr(dts, '_SEMANTIC_EMBEDDING_MODEL', "models/another-embedding")
+
+        assert dts.find_similar_feedback("gemini-1.5-flash", [1.0, 0.0]) is None
 
 
 class TestMainFunction:
     """Test cases for the main function."""
-    
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.temp_dir = tempfile.mkdtemp()
-        self.config_file = os.path.join(self.temp_dir, "test_config.yml")
-        
-        # Create a test config file
-        test_config = {
-            "subject": "test subject",
-            "tone": "professional",
-            "length": "50 words"
-        }
-        with open(self.config_file, 'w') as f:
-            yaml.dump(test_config, f)
-    
-    def teardown_method(self):
-        """Clean up test fixtures."""
-        import shutil
-        shutil.rmtree(self.temp_dir)
-    
-    @patch('src.detection_test_script.genai.configure')
-    @patch('src.detection_test_script.genai.GenerativeModel')
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_with_valid_api_key(self, mock_exit, mock_model_class, mock_configure):
+
+    def test_main_with_valid_api_key(self, mock_model, patched_genai, config_file):
         """Test main function with valid API key."""
-        # Mock the model and response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "This is a test response about test subject."
-        mock_model.generate_content.return_value = mock_response
-        mock_model_class.return_value = mock_model
-        
-        # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
-        
-        # Mock sys.argv
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file]):
-            main()
+        mock_configure, mock_model_class = patched_genai
+
+        assert main(['--yaml-file', config_file]) is None
         
         # Verify genai.configure was called
         mock_configure.assert_called_once()
@@ -94,166 +286,336 @@ class TestMainFunction:
         # Verify model was created and generate_content was called
         mock_model_class.assert_called_once_with('gemini-1.5-flash')
         mock_model.generate_content.assert_called_once()
-    
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_without_api_key(self, mock_exit):
+
+    def test_main_with_json_config_file(self, mock_model, patched_genai, tmp_path):
+        """Test main function with a JSON detection config."""
+        json_file = str(tmp_path / "detection.json")
+        with open(json_file, 'w') as f:
+            json.dump({
+                "title": "JSON detection",
+                "description": "Detects test activity",
+                "sql_search": "SELECT * FROM security_logs",
+                "source_table": "security_logs"
+            }, f)
+
+        main(['--yaml-file', json_file])
+
+        # Verify the JSON fields reached the prompt
+        assert "JSON detection" in mock_model.generate_content.call_args[0][0]
+
+    def test_main_with_custom_model(self, patched_genai, config_file):
+        """Test main function with custom model."""
+        _, mock_model_class = patched_genai
+
+        assert main(['--yaml-file', config_file, '--model', 'gemini-1.5-pro']) is None
+        
+        # Verify model was created with custom model
+        mock_model_class.assert_called_once_with('gemini-1.5-pro')
+
+    def test_main_with_api_key_argument(self, monkeypatch, patched_genai, config_file):
+        """Test main function with API key as command line argument."""
+        mock_configure, _ = patched_genai
+
+        # Remove environment variable
+        monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+        
+        assert main(['--yaml-file', config_file, '--api-key', TEST_API_KEY]) is None
+        
+        # Verify genai.configure was called
+        mock_configure.assert_called_once()
+
+    def test_main_with_multiple_yaml_files(self, mock_model, patched_genai, default_response, write_detection_config, tmp_path):
+        """Test main function sends multiple detections concurrently."""
+        # Create two valid detection config files
+        config_files = [
+            write_detection_config(str(tmp_path / f"{name}.yml"), f"{name} detection")
+            for name in ("first", "second")
+        ]
+
+        # Serve the default response through the async API
+        mock_model.generate_content_async = AsyncMock(return_value=default_response)
+
+        main(['--yaml-file'] + config_files)
+
+        # Verify one async request per detection and no blocking call
+        assert mock_model.generate_content_async.await_count == 2
+        mock_model.generate_content.assert_not_called()
+
+    def test_main_with_yaml_dir(self, mock_model, patched_genai, write_detection_config, tmp_path, capsys):
+        """Test main function reviews a directory of detections in one request."""
+        detection_dir = str(tmp_path / "detections")
+        os.mkdir(detection_dir)
+        for name in ("first", "second"):
+            write_detection_config(os.path.join(detection_dir, f"{name}.yml"), f"{name} detection")
+
+        # Return a combined response with numbered sections
+        mock_model.generate_content.return_value = Mock(
+            text="### Detection 1\nFirst feedback.\n### Detection 2\nSecond feedback."
+        )
+
+        main(['--yaml-dir', detection_dir])
+
+        # Verify both detections went out in a single prompt
+        mock_model.generate_content.assert_called_once()
+        prompt = mock_model.generate_content.call_args[0][0]
+        assert "### Detection 1" in prompt and "### Detection 2" in prompt
+        assert prompt.count("I am a cyber security detection engineer") == 1
+
+        # Verify each detection got its own section of the response
+        output = capsys.readouterr().out
+        assert "│ First feedback." in output
+        assert "│ Second feedback." in output
+
+    def test_main_with_yaml_dir_warns_about_semantic_cache(self, mocker, mock_model, patched_genai, write_detection_config, tmp_path, capsys):
+        """Test main function warns that --semantic-cache does not apply to --yaml-dir."""
+        mock_embed = mocker.patch.object(dts.genai, 'embed_content')
+        write_detection_config(str(tmp_path / "first.yml"))
+        mock_model.generate_content.return_value = Mock(text="### Detection 1\nFeedback.")
+
+        main(['--yaml-dir', str(tmp_path), '--semantic-cache'])
+
+        assert "--semantic-cache is not supported with --yaml-dir" in capsys.readouterr().out
+        mock_embed.assert_not_called()
+
+    def test_main_with_yaml_dir_unsplit_response(self, mock_model, patched_genai, write_detection_config, tmp_path, capsys):
+        """Test main function prints the whole response when it has no detection headings."""
+        detection_dir = str(tmp_path / "detections")
+        os.mkdir(detection_dir)
+        for name in ("first", "second"):
+            write_detection_config(os.path.join(detection_dir, f"{name}.yml"), f"{name} detection")
+
+        # Return a response that ignores the requested heading format
+        mock_model.generate_content.return_value = Mock(text="1. Tighten both SQL filters.")
+
+        main(['--yaml-dir', detection_dir])
+
+        # Verify the response is shown instead of per-detection placeholders
+        output = capsys.readouterr().out
+        assert "│ 1. Tighten both SQL filters." in output
+        assert "No feedback was returned" not in output
+
+    def test_main_streams_feedback(self, mock_model, patched_genai, write_detection_config, tmp_path, capsys):
+        """Test main function streams the response and caches the full text."""
+        config_file = write_detection_config(str(tmp_path / "stream.yml"))
+
+        # Mock a streamed response delivered in partial chunks
+        mock_response = MagicMock()
+        mock_response.__iter__.return_value = iter(
+            [Mock(text="1. First "), Mock(text="tip.\n2. Second tip.")]
+        )
+        mock_model.generate_content.return_value = mock_response
+
+        main(['--yaml-file', config_file])
+
+        # Verify streaming was requested and each complete line was boxed
+        assert mock_model.generate_content.call_args.kwargs == {"stream": True}
+        output = capsys.readouterr().out
+        assert "│ 1. First tip." in output
+        assert "│ 2. Second tip." in output
+
+    def test_main_streams_real_sdk_response(self, mock_model, patched_genai, write_detection_config, tmp_path, capsys):
+        """Test main function consumes a real SDK streaming response before reading it."""
+        from google.generativeai import protos
+        from google.generativeai.types import generation_types
+
+        config_file = write_detection_config(str(tmp_path / "sdk_stream.yml"))
+
+        # Build the same lazily-iterated response object the SDK returns for stream=True
+        def chunk(text):
+            return protos.GenerateContentResponse(candidates=[
+                protos.Candidate(content=protos.Content(role="model", parts=[protos.Part(text=text)]))
+            ])
+        mock_model.generate_content.return_value = generation_types.GenerateContentResponse.from_iterator(
+            iter([chunk("1. First "), chunk("tip.\n2. Second tip.")])
+        )
+
+        main(['--yaml-file', config_file])
+
+        # Verify the streamed text was printed and no error path ran
+        output = capsys.readouterr().out
+        assert "│ 1. First tip." in output
+        assert "│ 2. Second tip." in output
+        assert "Error" not in output
+
+    def test_main_reuses_cached_response(self, mock_model, patched_genai, write_detection_config, tmp_path, capsys):
+        """Test main function skips the model call for a previously seen prompt."""
+        config_file = write_detection_config(str(tmp_path / "cached.yml"))
+
+        # Run twice with the same config
+        main(['--yaml-file', config_file])
+        assert "📡 Sending request" in capsys.readouterr().out
+        main(['--yaml-file', config_file])
+
+        # Verify only the first run reached the model, and the cached run didn't claim to
+        mock_model.generate_content.assert_called_once()
+        output = capsys.readouterr().out
+        assert "📡 Sending request" not in output
+        assert "Using cached response" in output
+
+        # Verify --no-cache forces a fresh request
+        main(['--yaml-file', config_file, '--no-cache'])
+        assert mock_model.generate_content.call_count == 2
+
+    def test_main_reuses_semantically_similar_response(self, mocker, mock_model, patched_genai, write_detection_config, tmp_path):
+        """Test main function reuses a response for a near-duplicate detection."""
+        mock_embed = mocker.patch.object(dts.genai, 'embed_content')
+
+        pytest.importorskip("numpy")
+        first = write_detection_config(str(tmp_path / "first.yml"), "Original title")
+        second = write_detection_config(str(tmp_path / "second.yml"), "Reworded title")
+
+        # Mock near-identical embeddings for the two configs
+        mock_embed.side_effect = [{"embedding": [1.0, 0.0]}, {"embedding": [0.99, 0.01]}]
+
+        for config_file in (first, second):
+            main(['--yaml-file', config_file, '--semantic-cache'])
+
+        # Verify the reworded detection was served from the semantic cache
+        mock_model.generate_content.assert_called_once()
+        assert mock_embed.call_count == 2
+
+        # Verify only the detection fields were embedded, not the prompt template
+        content = mock_embed.call_args.kwargs["content"]
+        assert "title: Reworded title" in content
+        assert "sql_search: SELECT * FROM security_logs" in content
+        assert "I am a cyber security detection engineer" not in content
+
+
+class TestMainFunctionErrors:
+    """Test cases for the main function's error paths."""
+
+    def test_main_without_api_key(self, mock_exit, monkeypatch, config_file):
         """Test main function without API key."""
         # Remove environment variable if it exists
-        os.environ.pop('GEMINI_API_KEY', None)
+        monkeypatch.delenv('GEMINI_API_KEY', raising=False)
         
-        # Mock sys.argv
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file]):
-            main()
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', config_file])
         
         # Verify sys.exit was called
         mock_exit.assert_called_once_with(1)
-    
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_with_invalid_api_key(self, mock_exit):
+
+    def test_main_with_invalid_api_key(self, mock_exit, monkeypatch, config_file):
         """Test main function with invalid API key."""
         # Set invalid API key
-        os.environ['GEMINI_API_KEY'] = INVALID_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', INVALID_API_KEY)
         
-        # Mock sys.argv
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file]):
-            main()
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', config_file])
         
         # Verify sys.exit was called
         mock_exit.assert_called_once_with(1)
-    
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_with_nonexistent_yaml_file(self, mock_exit):
+
+    def test_main_with_nonexistent_yaml_file(self, mock_exit, monkeypatch):
         """Test main function with nonexistent YAML file."""
         # Set valid API key
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
         
-        # Mock sys.argv with nonexistent file
-        with patch('sys.argv', ['script', '--yaml-file', 'nonexistent.yml']):
-            main()
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', 'nonexistent.yml'])
         
         # Verify sys.exit was called
         mock_exit.assert_called_once_with(1)
-    
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_with_invalid_yaml_file(self, mock_exit):
+
+    def test_main_with_invalid_yaml_file(self, mock_exit, monkeypatch, tmp_path):
         """Test main function with invalid YAML file."""
         # Create invalid YAML file
-        invalid_yaml_file = os.path.join(self.temp_dir, "invalid.yml")
+        invalid_yaml_file = str(tmp_path / "invalid.yml")
         with open(invalid_yaml_file, 'w') as f:
             f.write("invalid: yaml: content: [")
         
         # Set valid API key
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
         
-        # Mock sys.argv
-        with patch('sys.argv', ['script', '--yaml-file', invalid_yaml_file]):
-            main()
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', invalid_yaml_file])
         
         # Verify sys.exit was called
         mock_exit.assert_called_once_with(1)
-    
-    @patch('src.detection_test_script.genai.configure')
-    @patch('src.detection_test_script.genai.GenerativeModel')
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_with_custom_model(self, mock_exit, mock_model_class, mock_configure):
-        """Test main function with custom model."""
-        # Mock the model and response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "This is a test response."
-        mock_model.generate_content.return_value = mock_response
-        mock_model_class.return_value = mock_model
-        
-        # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
-        
-        # Mock sys.argv with custom model
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file, '--model', 'gemini-1.5-pro']):
-            main()
-        
-        # Verify model was created with custom model
-        mock_model_class.assert_called_once_with('gemini-1.5-pro')
-    
-    @patch('src.detection_test_script.genai.configure')
-    @patch('src.detection_test_script.genai.GenerativeModel')
-    @patch('src.detection_test_script.sys.exit')
-    def test_main_with_api_key_argument(self, mock_exit, mock_model_class, mock_configure):
-        """Test main function with API key as command line argument."""
-        # Mock the model and response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "This is a test response."
-        mock_model.generate_content.return_value = mock_response
-        mock_model_class.return_value = mock_model
-        
-        # Remove environment variable
-        os.environ.pop('GEMINI_API_KEY', None)
-        
-        # Mock sys.argv with API key argument
-        with patch('sys.argv', ['script', '--yaml-file', self.config_file, '--api-key', TEST_API_KEY]):
-            main()
-        
-        # Verify genai.configure was called
-        mock_configure.assert_called_once()
+
+    def test_main_with_invalid_yaml_value(self, mock_exit, monkeypatch, tmp_path, capsys):
+        """Test main function reports a YAML value error as a YAML parsing error."""
+        config_file = tmp_path / "bad_date.yml"
+        config_file.write_text("title: Test detection\ndate: 2023-13-45\n")
+
+        # Set valid API key
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
+
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', str(config_file)])
+
+        # Verify the error names the right format
+        output = capsys.readouterr().out
+        assert "Error parsing YAML file" in output
+        assert "JSON" not in output
+        mock_exit.assert_called_once_with(1)
+
+    @pytest.mark.parametrize("name, content", [
+        ("empty.yml", ""),
+        ("list.yml", "- title: Test detection\n"),
+        ("array.json", '[{"title": "Test detection"}]'),
+    ])
+    def test_main_with_non_mapping_config(self, mock_exit, monkeypatch, tmp_path, capsys, name, content):
+        """Test main function rejects configs that are not a mapping of fields."""
+        config_file = tmp_path / name
+        config_file.write_text(content)
+
+        # Set valid API key
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
+
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', str(config_file)])
+
+        # Verify the missing-fields help was shown instead of a traceback
+        assert "Missing required fields: description, source_table, sql_search, title" in capsys.readouterr().out
+        mock_exit.assert_called_once_with(1)
+
+    def test_main_with_empty_yaml_dir(self, mock_exit, monkeypatch, capsys):
+        """Test main function reports an empty --yaml-dir path as an unreadable directory."""
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
+
+        with pytest.raises(SystemExit):
+            main(['--yaml-dir', ''])
+
+        assert "Error: Cannot read detection directory ''" in capsys.readouterr().out
+        mock_exit.assert_called_once_with(1)
+
+
+@pytest.fixture(scope="module")
+def err_config(tmp_path_factory, write_config):
+    """Write one detection config shared by the error-handling tests."""
+    return write_config(tmp_path_factory.mktemp("err") / "config.yml", DETECTION_CONFIG)
 
 
 class TestErrorHandling:
     """Test cases for error handling."""
-    
-    @patch('src.detection_test_script.genai.configure')
-    @patch('src.detection_test_script.sys.exit')
-    def test_genai_configure_error(self, mock_exit, mock_configure):
+
+    def test_genai_configure_error(self, mock_exit, mocker, monkeypatch, err_config):
         """Test error handling when genai.configure fails."""
+        mock_configure = mocker.patch.object(dts.genai, 'configure')
+
         # Mock genai.configure to raise an exception
         mock_configure.side_effect = Exception("Configuration error")
         
         # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
+        monkeypatch.setenv('GEMINI_API_KEY', TEST_API_KEY)
         
-        # Create temporary config file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yml', delete=False) as f:
-            yaml.dump({"subject": "test", "tone": "neutral", "length": "short"}, f)
-            config_file = f.name
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', err_config])
         
-        try:
-            # Mock sys.argv
-            with patch('sys.argv', ['script', '--yaml-file', config_file]):
-                main()
-            
-            # Verify sys.exit was called
-            mock_exit.assert_called_once_with(1)
-        finally:
-            # Clean up
-            os.unlink(config_file)
+        # Verify sys.exit was called
+        mock_exit.assert_called_once_with(1)
     
-    @patch('src.detection_test_script.genai.configure')
-    @patch('src.detection_test_script.genai.GenerativeModel')
-    @patch('src.detection_test_script.sys.exit')
-    def test_model_generation_error(self, mock_exit, mock_model_class, mock_configure):
+    def test_model_generation_error(self, mock_exit, mock_model, patched_genai, err_config):
         """Test error handling when model generation fails."""
         # Mock the model to raise an exception during generation
-        mock_model = MagicMock()
         mock_model.generate_content.side_effect = Exception("Generation error")
-        mock_model_class.return_value = mock_model
-        
-        # Set environment variable
-        os.environ['GEMINI_API_KEY'] = TEST_API_KEY
         
-        # Create temporary config file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yml', delete=False) as f:
-            yaml.dump({"subject": "test", "tone": "neutral", "length": "short"}, f)
-            config_file = f.name
+        with pytest.raises(SystemExit):
+            main(['--yaml-file', err_config])
         
-        try:
-            # Mock sys.argv
-            with patch('sys.argv', ['script', '--yaml-file', config_file]):
-                main()
-            
-            # Verify sys.exit was called
-            mock_exit.assert_called_once_with(1)
-        finally:
-            # Clean up
-            os.unlink(config_file)
+        # Verify sys.exit was called
+        mock_exit.assert_called_once_with(1)
 
 
 if __name__ == "__main__":